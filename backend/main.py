@@ -1,16 +1,19 @@
+from collections import Counter, defaultdict
+from functools import lru_cache
 from pathlib import Path
 import re
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 
+import numpy as np
 import pandas as pd
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 
 
-app = FastAPI(title="Movie Recommendation API")
+app = FastAPI(title="Movie Recommendation API", default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -35,30 +38,31 @@ if not TAGS_PATH.exists():
     raise FileNotFoundError(f"Missing file: {TAGS_PATH}")
 
 movies_df = pd.read_csv(MOVIES_PATH)
-ratings_df = pd.read_csv(RATINGS_PATH)
+ratings_df = pd.read_csv(
+    RATINGS_PATH,
+    usecols=["movieId", "rating"],
+    dtype={"movieId": np.int32, "rating": np.float32},
+)
 tags_df = pd.read_csv(TAGS_PATH)
 
 
-def normalize_title(title: str) -> str:
-    if not isinstance(title, str):
-        return title
+# Groups: 1 = name, 2 = article, 3 = year.
+TITLE_ARTICLE_RE = re.compile(r"^(.*?),\s(The|A|An)\s(\(\d{4}\))$")
 
-    m = re.match(r"^(?P<name>.*?),\s(?P<article>The|A|An)\s(?P<year>\(\d{4}\))$", title)
-    if m:
-        name = m.group("name").strip()
-        article = m.group("article").strip()
-        year = m.group("year").strip()
-        return f"{article} {name} {year}"
 
-    return title
+def normalize_titles(titles: pd.Series) -> pd.Series:
+    # "Matrix, The (1999)" -> "The Matrix (1999)"
+    return titles.astype(str).str.replace(TITLE_ARTICLE_RE, r"\2 \1 \3", regex=True)
 
 
-avg_rating_df = (
-    ratings_df
-    .groupby("movieId", as_index=False)["rating"]
-    .mean()
-    .rename(columns={"rating": "avg_rating"})
-)
+movie_codes, rated_movie_ids = pd.factorize(ratings_df["movieId"].to_numpy())
+rating_sums = np.bincount(movie_codes, weights=ratings_df["rating"].to_numpy(dtype=np.float64))
+rating_counts = np.bincount(movie_codes)
+
+avg_rating_df = pd.DataFrame({
+    "movieId": rated_movie_ids,
+    "avg_rating": rating_sums / rating_counts,
+})
 
 movies_with_rating_df = (
     movies_df
@@ -66,22 +70,44 @@ movies_with_rating_df = (
     .copy()
 )
 
-movies_with_rating_df["title"] = movies_with_rating_df["title"].astype(str).apply(normalize_title)
+movies_with_rating_df["title"] = normalize_titles(movies_with_rating_df["title"])
 movies_with_rating_df["avg_rating"] = movies_with_rating_df["avg_rating"].fillna(0.0)
-movies_with_rating_df["genres_raw"] = movies_with_rating_df["genres"].fillna("").astype(str)
-
-genre_counts = (
-    movies_df["genres"]
-    .dropna()
-    .str.split("|")
-    .explode()
-    .str.strip()
-    .str.title()
-    .loc[lambda s: s != "(No Genres Listed)"]
-    .value_counts()
-)
+movies_with_rating_df["genres_raw"] = movies_with_rating_df["genres"].fillna("").astype("category")
+movies_with_rating_df["movieId"] = movies_with_rating_df["movieId"].astype(np.int32)
+
+genre_counts = Counter()
+for genres in movies_df["genres"].dropna():
+    for part in genres.split("|"):
+        part = part.strip().title()
+        if part and part != "(No Genres Listed)":
+            genre_counts[part] += 1
+
+TOP_GENRES = [genre for genre, _ in genre_counts.most_common(10)]
+
+
+def build_genre_index() -> dict[str, np.ndarray]:
+    # Genre -> row positions in movies_with_rating_df, best rated first.
+    postings = defaultdict(list)
+    for idx, genres in enumerate(movies_with_rating_df["genres_raw"].str.title()):
+        for part in genres.split("|"):
+            part = part.strip()
+            if part:
+                postings[part].append(idx)
 
-TOP_GENRES = genre_counts.head(10).index.tolist()
+    ratings = movies_with_rating_df["avg_rating"].to_numpy()
+    index = {}
+    for genre, idxs in postings.items():
+        idxs = np.asarray(idxs)
+        index[genre] = idxs[np.argsort(-ratings[idxs], kind="stable")]
+
+    return index
+
+
+GENRE_INDEX = build_genre_index()
+
+MOVIE_IDS = movies_with_rating_df["movieId"].to_numpy()
+MOVIE_TITLES = movies_with_rating_df["title"].to_numpy()
+MOVIE_RATINGS = movies_with_rating_df["avg_rating"].to_numpy()
 
 
 def build_recommendation_df() -> pd.DataFrame:
@@ -95,8 +121,7 @@ def build_recommendation_df() -> pd.DataFrame:
         .agg(lambda x: " ".join(x))
     )
 
-    base = movies_df[["movieId", "title", "genres"]].copy()
-    base["title"] = base["title"].astype(str).apply(normalize_title)
+    base = movies_with_rating_df[["movieId", "title", "genres", "avg_rating"]].copy()
 
     base["genres"] = (
         base["genres"]
@@ -110,9 +135,6 @@ def build_recommendation_df() -> pd.DataFrame:
     base = base.merge(tags_grouped, on="movieId", how="left")
     base["tag"] = base["tag"].fillna("").astype(str).str.lower().str.strip()
 
-    base = base.merge(avg_rating_df, on="movieId", how="left")
-    base["avg_rating"] = base["avg_rating"].fillna(0.0)
-
     base["title_clean"] = (
         base["title"]
         .fillna("")
@@ -133,88 +155,112 @@ def build_recommendation_df() -> pd.DataFrame:
     return base
 
 
+MOOD_EXPANSIONS = {
+    "cry": "sad emotional drama tearjerker heartbreak",
+    "sad": "sad emotional drama melancholic tragedy",
+    "laugh": "funny comedy humorous silly parody",
+    "funny": "comedy humorous witty laugh",
+    "romantic": "romance love romantic relationship",
+    "love": "romance love romantic relationship",
+    "scared": "horror scary thriller suspense",
+    "fear": "horror scary thriller suspense",
+    "chill": "calm relaxing feel good slice of life",
+    "happy": "feel good uplifting comedy heartwarming",
+    "angry": "revenge intense action crime thriller",
+    "action": "action adventure thriller explosive",
+    "mystery": "mystery detective suspense thriller",
+    "anime": "anime animation japanese",
+}
+
+
 class TfidfRecommender:
     def __init__(self, df: pd.DataFrame):
         self.df = df.copy()
 
         self.vectorizer = TfidfVectorizer(
             stop_words="english",
-            max_features=50000,
+            max_features=10000,
             ngram_range=(1, 2),
             min_df=2,
+            dtype=np.float32,
         )
 
-        self.matrix = self.vectorizer.fit_transform(self.df["text"].fillna(""))
+        # Stored term-major (terms x movies) so scoring a query only walks
+        # the postings of the terms it contains.
+        self.matrix = self.vectorizer.fit_transform(self.df["text"].fillna("")).T.tocsr()
+        self.matrix.sort_indices()
+
+        self.movie_ids = self.df["movieId"].to_numpy()
+        self.titles = self.df["title"].to_numpy()
+        self.ratings = self.df["avg_rating"].to_numpy()
 
     def recommend(self, query: str, n: int) -> list[dict]:
         q = (query or "").strip().lower()
         if not q:
             return []
 
-        mood_expansions = {
-            "cry": "sad emotional drama tearjerker heartbreak",
-            "sad": "sad emotional drama melancholic tragedy",
-            "laugh": "funny comedy humorous silly parody",
-            "funny": "comedy humorous witty laugh",
-            "romantic": "romance love romantic relationship",
-            "love": "romance love romantic relationship",
-            "scared": "horror scary thriller suspense",
-            "fear": "horror scary thriller suspense",
-            "chill": "calm relaxing feel good slice of life",
-            "happy": "feel good uplifting comedy heartwarming",
-            "angry": "revenge intense action crime thriller",
-            "action": "action adventure thriller explosive",
-            "mystery": "mystery detective suspense thriller",
-            "anime": "anime animation japanese",
-        }
-
-        q_expanded = mood_expansions.get(q, q)
+        q_expanded = MOOD_EXPANSIONS.get(q, q)
 
+        # TF-IDF rows are L2-normalized, so cosine similarity is a plain dot product.
         query_vec = self.vectorizer.transform([q_expanded])
-        sims = cosine_similarity(query_vec, self.matrix).flatten()
-
-        valid_indices = (sims > 0).nonzero()[0]
+        # Only movies sharing a term with the query come out of the sparse
+        # product, so its stored entries are already the candidate set.
+        sims = query_vec @ self.matrix
+        sims.sort_indices()
+
+        positive = sims.data > 0
+        valid_indices = sims.indices[positive]
+        valid_sims = sims.data[positive]
         if len(valid_indices) == 0:
             return []
 
-        candidate_k = max(n * 10, 300)
-        valid_sims = sims[valid_indices]
-        top_local = valid_sims.argsort()[::-1][:candidate_k]
+        candidate_k = min(max(n * 10, 300), len(valid_indices))
+        top_local = np.argpartition(-valid_sims, candidate_k - 1)[:candidate_k]
+        top_local = top_local[np.argsort(-valid_sims[top_local])]
+
         top_indices = valid_indices[top_local]
+        ratings = self.ratings[top_indices]
+        scores = 0.85 * valid_sims[top_local].astype(np.float64) + 0.15 * (ratings / 5.0)
 
-        results = []
-        for idx in top_indices:
-            row = self.df.iloc[idx]
+        # Stable, so equal scores keep their similarity order.
+        order = np.argsort(-scores, kind="stable")[:n]
 
-            sim = float(sims[idx])
-            rating = float(row["avg_rating"]) if row["avg_rating"] is not None else 0.0
-            rating_norm = rating / 5.0
+        return [
+            {
+                "rank": i,
+                "movieId": int(self.movie_ids[idx]),
+                "title": self.titles[idx],
+                "rating": round(float(self.ratings[idx]), 2),
+            }
+            for i, idx in enumerate(top_indices[order], start=1)
+        ]
 
-            score = 0.85 * sim + 0.15 * rating_norm
 
-            results.append({
-                "movieId": int(row["movieId"]),
-                "title": row["title"],
-                "rating": round(rating, 2),
-                "score": score,
-            })
+rec_df = build_recommendation_df()
+recommender = TfidfRecommender(rec_df)
 
-        results = sorted(results, key=lambda x: -x["score"])[:n]
+RESULT_FIELDS = ("rank", "movieId", "title", "rating")
 
-        public_results = []
-        for i, r in enumerate(results, start=1):
-            public_results.append({
-                "rank": i,
-                "movieId": r["movieId"],
-                "title": r["title"],
-                "rating": r["rating"],
-            })
 
-        return public_results
+# The corpus is static, so responses depend only on the arguments.
+@lru_cache(maxsize=2048)
+def recommend_cached(query: str, n: int) -> tuple[tuple, ...]:
+    return tuple(
+        tuple(r[field] for field in RESULT_FIELDS)
+        for r in recommender.recommend(query=query, n=n)
+    )
 
 
-rec_df = build_recommendation_df()
-recommender = TfidfRecommender(rec_df)
+@lru_cache(maxsize=2048)
+def movies_by_genre_cached(genre: str, limit: int) -> tuple[tuple, ...]:
+    idxs = GENRE_INDEX.get(genre)
+    if idxs is None:
+        return ()
+
+    return tuple(
+        (i, int(MOVIE_IDS[idx]), MOVIE_TITLES[idx], round(float(MOVIE_RATINGS[idx]), 2))
+        for i, idx in enumerate(idxs[:limit], start=1)
+    )
 
 
 class FeedbackPayload(BaseModel):
@@ -235,7 +281,8 @@ def top_genres():
 @app.get("/recommend")
 def recommend(query: str, n: int = 50):
     n = max(1, min(int(n), 200))
-    return recommender.recommend(query=query, n=n)
+    q = (query or "").strip().lower()
+    return [dict(zip(RESULT_FIELDS, row)) for row in recommend_cached(q, n)]
 
 
 @app.get("/movies-by-genre")
@@ -243,22 +290,7 @@ def movies_by_genre(genre: str, limit: int = 50):
     g_title = genre.strip().title()
     limit = max(1, min(int(limit), 200))
 
-    df = movies_with_rating_df[
-        movies_with_rating_df["genres_raw"].str.contains(g_title, na=False)
-    ].copy()
-
-    df = df.sort_values("avg_rating", ascending=False)
-
-    results = []
-    for i, row in enumerate(df.head(limit).itertuples(index=False), start=1):
-        results.append({
-            "rank": i,
-            "movieId": int(row.movieId),
-            "title": row.title,
-            "rating": round(float(row.avg_rating), 2),
-        })
-
-    return results
+    return [dict(zip(RESULT_FIELDS, row)) for row in movies_by_genre_cached(g_title, limit)]
 
 
 @app.post("/feedback")